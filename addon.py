@@ -12,6 +12,7 @@ bl_info = {
 import bpy
 import bmesh
 from mathutils import Matrix, Vector, Euler
+import numpy as np
 import random
 import math
 
@@ -92,12 +93,10 @@ TREE_PRESETS = {
 }
 
 
-class TurtleState:
-    def __init__(self, position, orientation, length, radius):
-        self.position = position.copy()
-        self.orientation = orientation.copy()
-        self.length = length
-        self.radius = radius
+# Shared local axes; frozen so no caller can modify them in place
+X_AXIS = Vector((1, 0, 0)).freeze()
+Y_AXIS = Vector((0, 1, 0)).freeze()
+Z_AXIS = Vector((0, 0, 1)).freeze()
 
 
 class Turtle3D:
@@ -112,91 +111,119 @@ class Turtle3D:
         self.rotation_jitter = math.radians(rotation_jitter)
         self.length_jitter = length_jitter
         self.tropism_strength = tropism_strength
+        self.tropism_enabled = tropism_strength > 1e-6
         self.branch_spread = math.radians(branch_spread)
         self.stack = []
         self.branches = []
         self.leaf_positions = []
         self.leaf_orientations = []
         self.current_branch_points = []
-        random.seed(seed)
+        
+        # Without jitter every fixed turn is always the same rotation, so
+        # build those once; jittered turns are built per call instead
+        if self.rotation_jitter == 0:
+            self.yaw_right_matrix = Matrix.Rotation(self.angle, 3, 'Y')
+            self.yaw_left_matrix = Matrix.Rotation(-self.angle, 3, 'Y')
+            self.pitch_down_matrix = Matrix.Rotation(self.angle, 3, 'X')
+            self.pitch_up_matrix = Matrix.Rotation(-self.angle, 3, 'X')
+            self.roll_left_matrix = Matrix.Rotation(self.angle, 3, 'Z')
+            self.roll_right_matrix = Matrix.Rotation(-self.angle, 3, 'Z')
+            self.turn_around_matrix = Matrix.Rotation(math.pi, 3, 'Y')
+        else:
+            self.yaw_right_matrix = self.yaw_left_matrix = None
+            self.pitch_down_matrix = self.pitch_up_matrix = None
+            self.roll_left_matrix = self.roll_right_matrix = None
+            self.turn_around_matrix = None
+        self.rng = random.Random(seed)
     
     def get_forward(self):
-        return (self.orientation @ Vector((0, 0, 1))).normalized()
+        return (self.orientation @ Z_AXIS).normalized()
     
     def get_left(self):
-        return (self.orientation @ Vector((1, 0, 0))).normalized()
+        return (self.orientation @ X_AXIS).normalized()
     
     def get_up(self):
-        return (self.orientation @ Vector((0, 1, 0))).normalized()
+        return (self.orientation @ Y_AXIS).normalized()
     
     def apply_tropism(self):
-        if self.tropism_strength > 0:
-            tropism_direction = Vector((0, 0, 1))
-            forward = self.get_forward()
-            
-            correction_axis = forward.cross(tropism_direction)
-            
-            if correction_axis.length > 0.0001:
-                correction_axis.normalize()
-                angle = self.tropism_strength * self.current_length * 0.1
-                rot_matrix = Matrix.Rotation(angle, 3, correction_axis)
-                self.orientation = rot_matrix @ self.orientation
-    
-    def rotate_local(self, angle, local_axis):
-        jitter = random.uniform(-self.rotation_jitter, self.rotation_jitter)
-        total_angle = angle + jitter
+        if not self.tropism_enabled:
+            return
         
-        world_axis = (self.orientation @ local_axis).normalized()
+        forward = self.get_forward()
         
-        rot_matrix = Matrix.Rotation(total_angle, 3, world_axis)
-        self.orientation = rot_matrix @ self.orientation
+        correction_axis = forward.cross(Z_AXIS)
+        
+        if correction_axis.length > 0.0001:
+            # Matrix.Rotation normalizes the axis itself
+            angle = self.tropism_strength * self.current_length * 0.1
+            rot_matrix = Matrix.Rotation(angle, 3, correction_axis)
+            self.orientation = rot_matrix @ self.orientation
+    
+    def rotate_local(self, angle, local_axis, cached_matrix=None):
+        if cached_matrix is not None:
+            # Still draw the (zero) jitter sample so a seed keeps producing
+            # the same tree as the uncached path
+            self.rng.random()
+            self.orientation = self.orientation @ cached_matrix
+            return
+        
+        jitter = self.rng.uniform(-self.rotation_jitter, self.rotation_jitter)
+        total_angle = angle + jitter
+        
+        # Rotating about a turtle-local axis is a post-multiply in the local
+        # frame, so the world-space axis never needs to be computed
+        rot_matrix = Matrix.Rotation(total_angle, 3, local_axis)
+        self.orientation = self.orientation @ rot_matrix
     
     def yaw_right(self):
         # Add random Y-axis spread for 3D branching
-        y_spread = random.uniform(-self.branch_spread, self.branch_spread)
-        self.rotate_local(y_spread, Vector((0, 1, 0)))
-        self.rotate_local(self.angle, Vector((0, 1, 0)))
+        y_spread = self.rng.uniform(-self.branch_spread, self.branch_spread)
+        self.rotate_local(y_spread, 'Y')
+        self.rotate_local(self.angle, 'Y', self.yaw_right_matrix)
     
     def yaw_left(self):
         # Add random Y-axis spread for 3D branching
-        y_spread = random.uniform(-self.branch_spread, self.branch_spread)
-        self.rotate_local(y_spread, Vector((0, 1, 0)))
-        self.rotate_local(-self.angle, Vector((0, 1, 0)))
+        y_spread = self.rng.uniform(-self.branch_spread, self.branch_spread)
+        self.rotate_local(y_spread, 'Y')
+        self.rotate_local(-self.angle, 'Y', self.yaw_left_matrix)
     
     def pitch_down(self):
-        self.rotate_local(self.angle, Vector((1, 0, 0)))
+        self.rotate_local(self.angle, 'X', self.pitch_down_matrix)
     
     def pitch_up(self):
-        self.rotate_local(-self.angle, Vector((1, 0, 0)))
+        self.rotate_local(-self.angle, 'X', self.pitch_up_matrix)
     
     def roll_left(self):
-        self.rotate_local(self.angle, Vector((0, 0, 1)))
+        self.rotate_local(self.angle, 'Z', self.roll_left_matrix)
     
     def roll_right(self):
-        self.rotate_local(-self.angle, Vector((0, 0, 1)))
+        self.rotate_local(-self.angle, 'Z', self.roll_right_matrix)
     
     def turn_around(self):
-        self.rotate_local(math.pi, Vector((0, 1, 0)))
+        self.rotate_local(math.pi, 'Y', self.turn_around_matrix)
     
     def forward(self, draw=True):
-        jitter = 1.0 + random.uniform(-self.length_jitter, self.length_jitter)
+        jitter = 1.0 + self.rng.uniform(-self.length_jitter, self.length_jitter)
         step_length = self.current_length * jitter
         
         self.apply_tropism()
         
-        start_pos = self.position.copy()
-        start_radius = self.current_radius
+        start_point = (*self.position, self.current_radius)
         
         forward_vec = self.get_forward()
-        self.position += forward_vec * step_length
+        self.position = self.position + forward_vec * step_length
         
         if draw:
-            self.current_branch_points.append((start_pos.copy(), start_radius))
+            # Consecutive segments share their joint, so a straight run of N
+            # steps becomes N + 1 knots instead of 2N with duplicates
+            points = self.current_branch_points
+            if not points or points[-1] != start_point:
+                points.append(start_point)
             
             new_length = self.current_length * self.length_decay
             new_radius = self.current_radius * self.radius_decay
             
-            self.current_branch_points.append((self.position.copy(), new_radius))
+            self.current_branch_points.append((*self.position, new_radius))
             
             self.current_length = new_length
             self.current_radius = new_radius
@@ -205,40 +232,39 @@ class Turtle3D:
             self.current_radius *= self.radius_decay
     
     def push(self):
-        state = TurtleState(self.position, self.orientation, self.current_length, self.current_radius)
-        self.stack.append(state)
+        # Position and orientation are only ever rebound, never modified in
+        # place, so the stack can hold references instead of copies
+        self.stack.append((self.position, self.orientation, self.current_length, self.current_radius))
         
         # Apply random rotation around Z-axis (roll) when branching for full 3D spread
-        random_roll = random.uniform(0, math.pi * 2)
-        self.rotate_local(random_roll, Vector((0, 0, 1)))
+        random_roll = self.rng.uniform(0, math.pi * 2)
+        self.rotate_local(random_roll, 'Z')
         
-        if len(self.current_branch_points) > 0:
-            self.branches.append(self.current_branch_points[:])
-            self.current_branch_points = []
+        self.end_branch()
     
     def pop(self):
-        if len(self.current_branch_points) > 0:
-            self.branches.append(self.current_branch_points[:])
-            self.current_branch_points = []
+        self.end_branch()
         
         if self.stack:
-            state = self.stack.pop()
-            self.position = state.position.copy()
-            self.orientation = state.orientation.copy()
-            self.current_length = state.length
-            self.current_radius = state.radius
+            self.position, self.orientation, self.current_length, self.current_radius = self.stack.pop()
     
     def add_leaf(self):
-        self.leaf_positions.append(self.position.copy())
-        self.leaf_orientations.append(self.orientation.copy())
+        self.leaf_positions.append(self.position)
+        self.leaf_orientations.append(self.orientation)
+    
+    def end_branch(self):
+        # A curve needs at least two points, so single-point stubs are
+        # dropped here rather than reaching Blender
+        if len(self.current_branch_points) >= 2:
+            self.branches.append(self.current_branch_points)
+        self.current_branch_points = []
     
     def finalize(self):
-        if len(self.current_branch_points) > 0:
-            self.branches.append(self.current_branch_points[:])
+        self.end_branch()
 
 
-def expand_lsystem(axiom, rules, iterations):
-    current = axiom
+def parse_rules(rules):
+    """Compile rule text into a symbol -> replacement table"""
     rules_dict = {}
     
     for rule in rules.split('\n'):
@@ -250,47 +276,66 @@ def expand_lsystem(axiom, rules, iterations):
                 replacement = parts[1].strip()
                 rules_dict[symbol] = replacement
     
-    for _ in range(iterations):
-        next_string = ""
-        for char in current:
-            if char in rules_dict:
-                next_string += rules_dict[char]
-            else:
-                next_string += char
-        current = next_string
+    return rules_dict
+
+
+def expand_stream(axiom, rules, iterations):
+    """Yield the expanded L-system one symbol at a time without building the string"""
+    rules_dict = parse_rules(rules)
+    lookup = rules_dict.get
     
-    return current
+    # Each entry is a partially consumed replacement and its remaining depth
+    stack = [(iter(axiom), iterations)]
+    while stack:
+        symbols, depth = stack[-1]
+        if depth == 0:
+            yield from symbols
+            stack.pop()
+            continue
+        
+        for char in symbols:
+            replacement = lookup(char)
+            if replacement is not None:
+                stack.append((iter(replacement), depth - 1))
+                break
+            yield char
+        else:
+            stack.pop()
 
 
 def interpret_lsystem(lstring, turtle):
+    def pop_branch():
+        turtle.pop()
+        turtle.add_leaf()
+    
+    # Resolve each command symbol to its turtle method once, up front
+    commands = {
+        'F': turtle.forward,
+        'f': lambda: turtle.forward(draw=False),
+        '+': turtle.yaw_right,
+        '-': turtle.yaw_left,
+        '&': turtle.pitch_down,
+        '^': turtle.pitch_up,
+        '\\': turtle.roll_left,
+        '/': turtle.roll_right,
+        '|': turtle.turn_around,
+        '[': turtle.push,
+        ']': pop_branch,
+    }
+    get_command = commands.get
+    
     for char in lstring:
-        if char == 'F':
-            turtle.forward(draw=True)
-        elif char == 'f':
-            turtle.forward(draw=False)
-        elif char == '+':
-            turtle.yaw_right()
-        elif char == '-':
-            turtle.yaw_left()
-        elif char == '&':
-            turtle.pitch_down()
-        elif char == '^':
-            turtle.pitch_up()
-        elif char == '\\':
-            turtle.roll_left()
-        elif char == '/':
-            turtle.roll_right()
-        elif char == '|':
-            turtle.turn_around()
-        elif char == '[':
-            turtle.push()
-        elif char == ']':
-            turtle.pop()
-            turtle.add_leaf()
+        command = get_command(char)
+        if command is not None:
+            command()
     
     turtle.finalize()
 
 
+# foreach_set writes enum properties by their integer value
+HANDLE_AUTO = bpy.types.BezierSplinePoint.bl_rna.properties['handle_left_type'].enum_items['AUTO'].value
+
+
 def create_branch_curve(points, name, bevel_depth):
     curve_data = bpy.data.curves.new(name=name, type='CURVE')
     curve_data.dimensions = '3D'
@@ -299,40 +344,54 @@ def create_branch_curve(points, name, bevel_depth):
     curve_data.resolution_u = 12
     curve_data.fill_mode = 'FULL'
     
+    # Points are (x, y, z, radius) rows; split them into flat arrays so
+    # coordinates and radii are written in one call each
+    points = np.array(points, dtype=np.float32)
+    coords = points[:, :3].ravel()
+    radii = np.ascontiguousarray(points[:, 3])
+    
     spline = curve_data.splines.new(type='BEZIER')
     spline.bezier_points.add(len(points) - 1)
+    spline.bezier_points.foreach_set("co", coords)
+    spline.bezier_points.foreach_set("radius", radii)
     
-    for i, (pos, radius) in enumerate(points):
-        bp = spline.bezier_points[i]
-        bp.co = pos
-        bp.handle_left_type = 'AUTO'
-        bp.handle_right_type = 'AUTO'
-        bp.radius = radius
+    handle_types = np.full(len(points), HANDLE_AUTO, dtype=np.int32)
+    spline.bezier_points.foreach_set("handle_left_type", handle_types)
+    spline.bezier_points.foreach_set("handle_right_type", handle_types)
+    
+    # Bulk writes skip Blender's update callbacks, so one regular assignment
+    # is still needed to recalculate the AUTO handles of the whole spline
+    spline.bezier_points[-1].handle_right_type = 'AUTO'
     
     curve_obj = bpy.data.objects.new(name, curve_data)
     return curve_obj
 
 
-def create_leaf_mesh(size):
+# UV layers carrying per-leaf coordinates for the leaf material
+LEAF_LOCAL_UV = "LeafLocal"
+LEAF_BOUNDS_UV = "LeafBounds"
+
+
+def create_leaf_mesh(size, matrices):
     mesh = bpy.data.meshes.new("Leaf_Mesh")
     bm = bmesh.new()
     
     # Create a more detailed leaf shape with center vein
-    verts = [
+    leaf_shape = [
         # Base of leaf
-        bm.verts.new(Vector((0, 0, 0))),
+        Vector((0, 0, 0)),
         # Left side points
-        bm.verts.new(Vector((-size * 0.15, 0, size * 0.2))),
-        bm.verts.new(Vector((-size * 0.35, 0, size * 0.4))),
-        bm.verts.new(Vector((-size * 0.3, 0, size * 0.6))),
-        bm.verts.new(Vector((-size * 0.15, 0, size * 0.8))),
+        Vector((-size * 0.15, 0, size * 0.2)),
+        Vector((-size * 0.35, 0, size * 0.4)),
+        Vector((-size * 0.3, 0, size * 0.6)),
+        Vector((-size * 0.15, 0, size * 0.8)),
         # Tip
-        bm.verts.new(Vector((0, 0, size))),
+        Vector((0, 0, size)),
         # Right side points
-        bm.verts.new(Vector((size * 0.15, 0, size * 0.8))),
-        bm.verts.new(Vector((size * 0.3, 0, size * 0.6))),
-        bm.verts.new(Vector((size * 0.35, 0, size * 0.4))),
-        bm.verts.new(Vector((size * 0.15, 0, size * 0.2))),
+        Vector((size * 0.15, 0, size * 0.8)),
+        Vector((size * 0.3, 0, size * 0.6)),
+        Vector((size * 0.35, 0, size * 0.4)),
+        Vector((size * 0.15, 0, size * 0.2)),
     ]
     
     # Create faces for the leaf
@@ -347,8 +406,23 @@ def create_leaf_mesh(size):
         [0, 8, 9],
     ]
     
-    for face_idx in faces_indices:
-        bm.faces.new([verts[i] for i in face_idx])
+    # Every leaf lives in one object, so the material cannot use Object or
+    # Generated coordinates; store the leaf's own coordinates instead, both
+    # in object units and normalized to the leaf's bounds
+    local_uvs = [(co.x, co.z) for co in leaf_shape]
+    bounds_uvs = [(co.x / (size * 0.7) + 0.5, co.z / size) for co in leaf_shape]
+    local_layer = bm.loops.layers.uv.new(LEAF_LOCAL_UV)
+    bounds_layer = bm.loops.layers.uv.new(LEAF_BOUNDS_UV)
+    
+    # Bake each leaf's transform into its own copy of the shape
+    for matrix in matrices:
+        verts = [bm.verts.new(matrix @ co) for co in leaf_shape]
+        for face_idx in faces_indices:
+            face = bm.faces.new([verts[i] for i in face_idx])
+            face.smooth = True
+            for loop, i in zip(face.loops, face_idx):
+                loop[local_layer].uv = local_uvs[i]
+                loop[bounds_layer].uv = bounds_uvs[i]
     
     bm.to_mesh(mesh)
     bm.free()
@@ -431,9 +505,14 @@ def create_leaf_material():
     gradient.location = (-600, 200)
     gradient.gradient_type = 'LINEAR'
     
-    # Texture coordinate
-    tex_coord = nodes.new(type='ShaderNodeTexCoord')
-    tex_coord.location = (-800, 200)
+    # Per-leaf coordinates written by create_leaf_mesh
+    leaf_local = nodes.new(type='ShaderNodeUVMap')
+    leaf_local.location = (-800, 200)
+    leaf_local.uv_map = LEAF_LOCAL_UV
+    
+    leaf_bounds = nodes.new(type='ShaderNodeUVMap')
+    leaf_bounds.location = (-800, -100)
+    leaf_bounds.uv_map = LEAF_BOUNDS_UV
     
     # Color ramp for green gradient
     color_ramp = nodes.new(type='ShaderNodeValToRGB')
@@ -454,7 +533,8 @@ def create_leaf_material():
     mix_rgb.inputs['Factor'].default_value = 0.3
     
     # Connect nodes
-    links.new(tex_coord.outputs['Object'], gradient.inputs['Vector'])
+    links.new(leaf_local.outputs['UV'], gradient.inputs['Vector'])
+    links.new(leaf_bounds.outputs['UV'], noise.inputs['Vector'])
     links.new(gradient.outputs['Fac'], color_ramp.inputs['Fac'])
     links.new(color_ramp.outputs['Color'], mix_rgb.inputs['A'])
     links.new(noise.outputs['Fac'], mix_rgb.inputs['B'])
@@ -468,18 +548,22 @@ def create_tree(axiom, rules, iterations, angle, initial_length, length_decay,
                 initial_radius, radius_decay, bevel_depth, rotation_jitter, 
                 length_jitter, tropism_strength, seed, add_leaves, leaf_size, leaf_jitter, branch_spread):
     
-    lstring = expand_lsystem(axiom, rules, iterations)
-    
     turtle = Turtle3D(angle, initial_length, initial_radius, length_decay, 
                       radius_decay, rotation_jitter, length_jitter, tropism_strength, seed, branch_spread)
     
-    interpret_lsystem(lstring, turtle)
+    # Stream symbols straight into the turtle so the fully expanded string
+    # never has to exist in memory
+    interpret_lsystem(expand_stream(axiom, rules, iterations), turtle)
     
     collection_name = "L-System Tree"
     if collection_name in bpy.data.collections:
         old_collection = bpy.data.collections[collection_name]
-        for obj in list(old_collection.objects):
-            bpy.data.objects.remove(obj, do_unlink=True)
+        old_objects = list(old_collection.objects)
+        
+        # Also drop curve and mesh data only the old tree used, so they are
+        # not left behind as orphans; everything goes in one removal pass
+        old_data = {obj.data for obj in old_objects if obj.data is not None and obj.data.users == 1}
+        bpy.data.batch_remove(ids=old_objects + list(old_data))
         bpy.data.collections.remove(old_collection)
     
     tree_collection = bpy.data.collections.new(collection_name)
@@ -491,63 +575,39 @@ def create_tree(axiom, rules, iterations, angle, initial_length, length_decay,
     
     # Create branches with bark material
     for i, branch_points in enumerate(turtle.branches):
-        if len(branch_points) >= 2:
-            curve_obj = create_branch_curve(branch_points, f"Branch_{i}", bevel_depth)
-            
-            # Apply bark material
-            if curve_obj.data.materials:
-                curve_obj.data.materials[0] = bark_material
-            else:
-                curve_obj.data.materials.append(bark_material)
-            
-            tree_collection.objects.link(curve_obj)
+        curve_obj = create_branch_curve(branch_points, f"Branch_{i}", bevel_depth)
+        
+        # Fresh curve data has no material slots yet
+        curve_obj.data.materials.append(bark_material)
+        
+        tree_collection.objects.link(curve_obj)
     
     if add_leaves and len(turtle.leaf_positions) > 0:
-        leaf_mesh = create_leaf_mesh(leaf_size)
-        leaf_template = bpy.data.objects.new("Leaf_Template", leaf_mesh)
-        tree_collection.objects.link(leaf_template)
-        leaf_template.hide_viewport = True
-        leaf_template.hide_render = True
+        # Sample all leaf randomness in two calls rather than six per leaf
+        leaf_count = len(turtle.leaf_positions)
+        rng = np.random.default_rng(seed + 1)
+        position_jitter = rng.uniform(-leaf_jitter, leaf_jitter, (leaf_count, 3))
+        twists = rng.uniform((-0.3, -0.3, 0.0), (0.3, 0.3, math.pi * 2), (leaf_count, 3))
         
-        random.seed(seed + 1)
-        
-        for i, (leaf_pos, leaf_orientation) in enumerate(zip(turtle.leaf_positions, turtle.leaf_orientations)):
-            leaf_instance = bpy.data.objects.new(f"Leaf_{i}", leaf_mesh)
-            
-            # Apply leaf material
-            if leaf_instance.data.materials:
-                leaf_instance.data.materials[0] = leaf_material
-            else:
-                leaf_instance.data.materials.append(leaf_material)
+        leaf_matrices = []
+        for leaf_pos, leaf_orientation, offset, twist in zip(turtle.leaf_positions, turtle.leaf_orientations,
+                                                              position_jitter.tolist(), twists.tolist()):
+            jitter_pos = leaf_pos + Vector(offset)
+            random_twist = Euler(twist, 'XYZ')
             
-            jitter_pos = leaf_pos + Vector((
-                random.uniform(-leaf_jitter, leaf_jitter),
-                random.uniform(-leaf_jitter, leaf_jitter),
-                random.uniform(-leaf_jitter, leaf_jitter)
-            ))
-            
-            leaf_instance.location = jitter_pos
-            
-            forward = (leaf_orientation @ Vector((0, 0, 1))).normalized()
-            up = (leaf_orientation @ Vector((0, 1, 0))).normalized()
-            
-            rotation_matrix = leaf_orientation.to_4x4()
-            leaf_instance.matrix_world = rotation_matrix
-            leaf_instance.location = jitter_pos
-            
-            random_twist = Euler((
-                random.uniform(-0.3, 0.3),
-                random.uniform(-0.3, 0.3),
-                random.uniform(0, math.pi * 2)
-            ), 'XYZ')
-            
-            leaf_instance.rotation_euler.rotate(random_twist)
-            
-            # Set smooth shading for leaves
-            for poly in leaf_instance.data.polygons:
-                poly.use_smooth = True
-            
-            tree_collection.objects.link(leaf_instance)
+            # Twist is applied in world space on top of the turtle orientation;
+            # the translation goes straight into the last column
+            leaf_matrix = (random_twist.to_matrix() @ leaf_orientation).to_4x4()
+            leaf_matrix.translation = jitter_pos
+            leaf_matrices.append(leaf_matrix)
+        
+        # All leaves share one mesh object, so Blender only has to manage a
+        # single object no matter how many leaves the tree has
+        leaf_mesh = create_leaf_mesh(leaf_size, leaf_matrices)
+        leaf_mesh.materials.append(leaf_material)
+        
+        leaves = bpy.data.objects.new("Leaves", leaf_mesh)
+        tree_collection.objects.link(leaves)
     
     return tree_collection
 